@@ -1,9 +1,13 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer
 from fields import OUTPUT_KEYS
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache, partial
 import argparse
 import re
+from urllib.parse import urljoin
 
 # --- UI Mapping: Japanese label -> output key ---
 UI_MAPPING = {
@@ -103,123 +107,184 @@ DEFAULT_FEATURES = [
     "western_toilet", "credit_card",
 ]
 
+_BASE_URL = "https://rent.tokyu-housing-lease.co.jp"
+
+# --- Shared HTTP session (keep-alive connection pool) ---
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+
+# --- Only label containers and images are kept in the parsed tree ---
+# (straining on dl/tr keeps each dt/th paired with its own dd/td)
+_STRAINER = SoupStrainer(["dl", "tr", "img"])
+
+# --- Static initializers, copied per page instead of rebuilt ---
+_EMPTY_DATA = {k: None for k in OUTPUT_KEYS}
+_FACING_N = {k: "N" for k in JP_TO_EN_FACING.values()}
+_FEATURE_KEYS = tuple(FEATURES_MAPPING.values())
+_DEFAULT_Y = {k: "Y" for k in DEFAULT_FEATURES}
+
+_IMG_CAT_KEYS = tuple(f"image_category_{i}" for i in range(1, 17))
+_IMG_URL_KEYS = tuple(f"image_url_{i}" for i in range(1, 17))
+_EMPTY_IMAGE_SLOTS = {
+    key: None
+    for pair in zip(_IMG_CAT_KEYS, _IMG_URL_KEYS)
+    for key in pair
+}
+
+# --- Combined fields: output key -> (target keys, separator, "-" means "0") ---
+_SPLIT_FIELDS = {
+    "floor_no/floors": (("floor_no", "floors"), "/", False),
+    "deposit/security_deposit": (("months_security_deposit", "numeric_security_deposit"), "/", True),
+    "key_money/amortization": (("months_key", "numeric_key"), "/", True),
+}
+
+# --- Precompiled address patterns (no "^": match() anchors at pos) ---
+_RE_PREF = re.compile(r"(.*?[都道府県])")
+_RE_CITY = re.compile(r"(.*?[市区町村])")
+_RE_DIST = re.compile(r"([^\d]+)")
+
+# --- Characters stripped from a rent string before converting to yen ---
+_RE_RENT = re.compile(r"[,\s]|万円")
+
 # --- Helper functions ---
-def get_value_by_label(soup, label: str):
-    """Find value in <dt>/<dd> or <th>/<td> by Japanese label"""
-    dt = soup.find(lambda tag: tag.name == "dt" and label in tag.get_text(strip=True))
-    if dt and dt.find_next_sibling("dd"):
-        return dt.find_next_sibling("dd").get_text(strip=True)
-    th = soup.find(lambda tag: tag.name == "th" and label in tag.get_text(strip=True))
-    if th and th.find_next_sibling("td"):
-        return th.find_next_sibling("td").get_text(strip=True)
-    return None
+def build_label_map(soup):
+    """Collect every <dt>/<dd> and <th>/<td> pair into a label -> value dict in one pass"""
+    label_map = {}
+    for label_tag, value_tag in (("dt", "dd"), ("th", "td")):
+        for tag in soup.find_all(label_tag):
+            sibling = tag.find_next_sibling(value_tag)
+            if sibling:
+                label_map.setdefault(tag.get_text(strip=True), sibling.get_text(strip=True))
+    return label_map
 
+@lru_cache(maxsize=4096)
 def parse_japanese_address(address):
     """Split Japanese address into prefecture, city, district, chome/banchi"""
-    prefecture_match = re.match(r"^(.*?[都道府県])", address)
-    prefecture = prefecture_match.group(1) if prefecture_match else None
+    m = _RE_PREF.match(address)
+    prefecture = m.group(1) if m else None
+    i = m.end() if m else 0
 
-    remaining = address[len(prefecture):] if prefecture else address
+    m = _RE_CITY.match(address, i)
+    city = m.group(1) if m else None
+    i = m.end() if m else i
 
-    city_match = re.match(r"^(.*?[市区町村])", remaining)
-    city = city_match.group(1) if city_match else None
+    m = _RE_DIST.match(address, i)
+    district = m.group(1) if m else None
+    i = m.end() if m else i
 
-    remaining = remaining[len(city):] if city else remaining
-
-    district_match = re.match(r"^([^\d]+)", remaining)
-    district = district_match.group(1) if district_match else None
-
-    chome_banchi = remaining[len(district):] if district else remaining
+    chome_banchi = address[i:]
     return prefecture, city, district, chome_banchi
 
-def parse_images(soup, data, max_images=16):
+def parse_images(soup, data, max_images=16, base_url=_BASE_URL):
     """Extract up to max_images images with category + URL"""
-    images = soup.select("img")
+    data.update(_EMPTY_IMAGE_SLOTS)
+    max_images = min(max_images, len(_IMG_URL_KEYS))
+    # Walk the tree lazily so the scan stops once max_images are found
+    images = (tag for tag in soup.descendants if tag.name == "img")
     count = 0
     for img in images:
         if count >= max_images:
             break
-        url = img.get("src") or img.get("data-src") or img.get("data-lazy")
+        attrs = img.attrs
+        url = attrs.get("src") or attrs.get("data-src") or attrs.get("data-lazy")
         if not url:
             continue
-        if url.startswith("/"):
-            url = "https://rent.tokyu-housing-lease.co.jp" + url
-        category = img.get("alt") or "None"
+        url = urljoin(base_url, url)
+        category = attrs.get("alt") or "None"
+        data[_IMG_CAT_KEYS[count]] = category
+        data[_IMG_URL_KEYS[count]] = url
         count += 1
-        data[f"image_category_{count}"] = category
-        data[f"image_url_{count}"] = url
-    # Fill remaining slots with None
-    for i in range(count + 1, max_images + 1):
-        data[f"image_category_{i}"] = None
-        data[f"image_url_{i}"] = None
-
-def parse_property(url):
+
+# --- Field handlers: output key -> special handling of the crawled value ---
+def _h_address(data, value):
+    prefecture, city, district, chome_banchi = parse_japanese_address(value)
+    data.update({"prefecture": prefecture, "city": city, "district": district, "chome_banchi": chome_banchi})
+
+def _h_facing(data, value):
+    data.update(_FACING_N)
+    key_name = JP_TO_EN_FACING.get(value.strip())
+    if key_name:
+        data[key_name] = "Y"
+
+def _h_features(data, value):
+    present = {f.strip() for f in value.split("、")}
+    for key in _FEATURE_KEYS:
+        data[key] = "N"
+    for jp_feature, key in FEATURES_MAPPING.items():
+        if jp_feature in present:
+            data[key] = "Y"
+    data.update(_DEFAULT_Y)
+
+def _h_split(keys, sep, dash_zero, data, value):
+    """Split a combined value across keys; "-" fee parts become "0" and need a full set"""
+    parts = [p.strip() for p in value.split(sep)]
+    if dash_zero and len(parts) != len(keys):
+        return
+    for key, part in zip(keys, parts):
+        data[key] = "0" if dash_zero and part == "-" else part
+
+def _h_rent(data, value):
+    if "〜" in value:
+        value = value.split("〜")[0].strip()
+    data["monthly_rent"] = value
+
+_HANDLERS = {
+    "address": _h_address,
+    "facing": _h_facing,
+    "features": _h_features,
+    "monthly_rent": _h_rent,
+    **{key: partial(_h_split, *spec) for key, spec in _SPLIT_FIELDS.items()},
+}
+
+def _set_field(data, output_key, value):
+    """Store a crawled UI value, routing special fields through their handler"""
+    if not value:
+        return
+    handler = _HANDLERS.get(output_key)
+    if handler:
+        handler(data, value)
+    else:
+        data[output_key] = value
+
+def parse_property(url, session=None):
     """Main parsing function"""
-    resp = requests.get(url)
-    resp.encoding = resp.apparent_encoding
-    soup = BeautifulSoup(resp.text, "html.parser")
+    resp = (session or _SESSION).get(url, timeout=(5, 20))
+    resp.raise_for_status()
+    # Trust a charset declared by the server; otherwise let lxml sniff <meta charset>
+    declared = "charset=" in resp.headers.get("Content-Type", "").lower()
+    soup = BeautifulSoup(
+        resp.content, "lxml",
+        parse_only=_STRAINER,
+        from_encoding=resp.encoding if declared else None,
+    )
+    label_map = build_label_map(soup)
 
-    data = {key: None for key in OUTPUT_KEYS}
+    data = _EMPTY_DATA.copy()
     data["link"] = url
     data["create_date"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-    # Parse UI fields
-    for jp_label, output_key in UI_MAPPING.items():
-        value = get_value_by_label(soup, jp_label)
-        if not value:
+    # Parse UI fields: labels found verbatim on the page, in page order
+    matched = set()
+    for label, value in label_map.items():
+        output_key = UI_MAPPING.get(label)
+        if output_key is None:
             continue
+        matched.add(label)
+        _set_field(data, output_key, value)
 
-        # Special handling by field type
-        if output_key == "address":
-            prefecture, city, district, chome_banchi = parse_japanese_address(value)
-            data.update({"prefecture": prefecture, "city": city, "district": district, "chome_banchi": chome_banchi})
-            continue
-        if output_key == "facing":
-            for k in JP_TO_EN_FACING.values():
-                data[k] = "N"
-            key_name = JP_TO_EN_FACING.get(value.strip())
-            if key_name:
-                data[key_name] = "Y"
-            continue
-        if output_key == "features":
-            features_list = [f.strip() for f in value.split("、")]
-            for jp_feature, key in FEATURES_MAPPING.items():
-                data[key] = "Y" if jp_feature in features_list else "N"
-            for key in DEFAULT_FEATURES:
-                data[key] = "Y"
-            continue
-        if output_key == "floor_no/floors":
-            parts = value.split("/")
-            data["floor_no"] = parts[0].strip() if len(parts) > 0 else None
-            data["floors"] = parts[1].strip() if len(parts) > 1 else None
-            continue
-        if output_key == "deposit/security_deposit":
-            parts = value.split("/")
-            if len(parts) == 2:
-                data["months_security_deposit"] = "0" if parts[0].strip() == "-" else parts[0].strip()
-                data["numeric_security_deposit"] = "0" if parts[1].strip() == "-" else parts[1].strip()
-            continue
-        if output_key == "key_money/amortization":
-            parts = value.split("/")
-            if len(parts) == 2:
-                data["months_key"] = "0" if parts[0].strip() == "-" else parts[0].strip()
-                data["numeric_key"] = "0" if parts[1].strip() == "-" else parts[1].strip()
-            continue
-        if output_key == "monthly_rent":
-            if "〜" in value:
-                value = value.split("〜")[0].strip()
-            data["monthly_rent"] = value
+    # Fall back to a partial label match for UI labels the page words differently
+    for jp_label, output_key in UI_MAPPING.items():
+        if jp_label in matched:
             continue
-
-        # Default case
-        data[output_key] = value
+        value = next((v for k, v in label_map.items() if jp_label in k), None)
+        _set_field(data, output_key, value)
 
     # --- Calculate rent & fees ---
     rent = 0
     monthly_rent = data.get("monthly_rent")
     if monthly_rent and monthly_rent != "-":
         try:
-            rent_str = monthly_rent.split("〜")[0].replace("万円", "").replace(",", "").strip()
+            rent_str = _RE_RENT.sub("", monthly_rent.split("〜", 1)[0])
             rent = float(rent_str) * 10000
         except ValueError:
             rent = 0
@@ -232,16 +297,39 @@ def parse_property(url):
         data["months_agency"] = round(rent * 1.1, 0)
 
     # --- Images ---
-    parse_images(soup, data)
+    parse_images(soup, data, base_url=url)
 
     return data
 
+def parse_properties(urls, max_workers=16, session=None):
+    """Parse many listings concurrently; a failed listing yields {"link", "error"}"""
+    session = session or _SESSION
+
+    def parse_one(url):
+        try:
+            return parse_property(url, session)
+        except Exception as e:
+            return {"link": url, "error": str(e)}
+
+    with ThreadPoolExecutor(max_workers) as ex:
+        return list(ex.map(parse_one, urls))
+
 # --- CLI Entry Point ---
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Crawl property data")
-    parser.add_argument("--url", type=str, required=True, help="Property listing URL")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--url", type=str, help="Property listing URL")
+    source.add_argument("--urls-file", type=str, help="File with one property listing URL per line")
     args = parser.parse_args()
 
-    result = parse_property(args.url)
-    for key, val in result.items():
-        print(f"{key} : {val}")
+    if args.url:
+        results = [parse_property(args.url)]
+    else:
+        with open(args.urls_file, encoding="utf-8") as f:
+            results = parse_properties([line.strip() for line in f if line.strip()])
+
+    for i, result in enumerate(results):
+        if i:
+            print()
+        for key, val in result.items():
+            print(f"{key} : {val}")